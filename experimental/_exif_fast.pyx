@@ -0,0 +1,41 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+""" Compiled IFD walker used by jpegreader.py when available.
+
+Build in place with `cythonize -i _exif_fast.pyx`; without it the readers
+fall back to their pure-Python implementation.
+"""
+from libc.stdint cimport uint8_t, uint16_t, uint32_t
+
+cdef inline uint16_t rd_u16_le(const uint8_t *p) nogil:
+    return p[0] | (p[1] << 8)
+
+cdef inline uint16_t rd_u16_be(const uint8_t *p) nogil:
+    return (p[0] << 8) | p[1]
+
+cdef inline uint32_t rd_u32_le(const uint8_t *p) nogil:
+    return p[0] | (p[1] << 8) | (p[2] << 16) | (<uint32_t>p[3] << 24)
+
+cdef inline uint32_t rd_u32_be(const uint8_t *p) nogil:
+    return (<uint32_t>p[0] << 24) | (p[1] << 16) | (p[2] << 8) | p[3]
+
+def walk_ifd(const uint8_t[::1] data, Py_ssize_t offset, bint little):
+    """ Returns the (tag, type, count, value_offset) entries of the IFD at offset. """
+    cdef const uint8_t *p
+    cdef Py_ssize_t number_of_tags, i
+
+    if offset < 0 or offset + 2 > data.shape[0]:
+        raise ValueError("Invalid EXIF data.")
+    p = &data[offset]
+    number_of_tags = rd_u16_le(p) if little else rd_u16_be(p)
+    if offset + 2 + 12 * number_of_tags > data.shape[0]:
+        raise ValueError("Invalid EXIF data.")
+    p += 2
+
+    entries = []
+    for i in range(number_of_tags):
+        if little:
+            entries.append((rd_u16_le(p), rd_u16_le(p + 2), rd_u32_le(p + 4), rd_u32_le(p + 8)))
+        else:
+            entries.append((rd_u16_be(p), rd_u16_be(p + 2), rd_u32_be(p + 4), rd_u32_be(p + 8)))
+        p += 12
+    return entries
@@ -0,0 +1,54 @@
+""" EXIF tag names shared by jpegreader.py and rafreader.py. """
+from types import MappingProxyType
+
+# Common EXIF tags
+EXIF_TAGS = MappingProxyType({
+    0x0100: 'ImageWidth',
+    0x0101: 'ImageHeight',
+    0x010F: 'Make',
+    0x0110: 'Model',
+    0x0112: 'Orientation',
+    0x011A: 'XResolution',
+    0x011B: 'YResolution',
+    0x0128: 'ResolutionUnit',
+    0x0131: 'Software',
+    0x0132: 'DateTime',
+    0x013B: 'Artist',
+    0x013E: 'WhitePoint',
+    0x013F: 'PrimaryChromaticities',
+    0x0211: 'YCbCrCoefficients',
+    0x0213: 'YCbCrPositioning',
+    0x8298: 'Copyright',
+    0x829A: 'ExposureTime',
+    0x829D: 'FNumber',
+    0x8769: 'ExifOffset',
+    0x8827: 'ISOSpeedRatings',
+    0x9003: 'DateTimeOriginal',
+    0x9004: 'DateTimeDigitized',
+    0x9201: 'ShutterSpeedValue',
+    0x9202: 'ApertureValue',
+    0x9204: 'ExposureBiasValue',
+    0x9206: 'SubjectDistance',
+    0x9207: 'MeteringMode',
+    0x9209: 'Flash',
+    0x9214: 'SubjectArea',
+    0x927C: 'MakerNote',
+    0x9286: 'UserComment',
+    0xA001: 'ColorSpace',
+    0xA002: 'ExifImageWidth',
+    0xA003: 'ExifImageHeight',
+    0xA005: 'InteroperabilityOffset',
+    0xA20E: 'FocalPlaneXResolution',
+    0xA20F: 'FocalPlaneYResolution',
+    0xA210: 'FocalPlaneResolutionUnit',
+    0xA217: 'SensingMethod',
+    0xA300: 'FileSource',
+    0xA301: 'SceneType',
+    0xA430: 'CameraOwnerName',
+    0xA431: 'SerialNumber',
+    0xA432: 'LensInfo',
+    0xA433: 'LensMake',
+    0xA434: 'LensModel',
+    0xA435: 'LensSerialNumber',
+    0xC4A5: 'PrintIM',
+})
@@ -0,0 +1,42 @@
+""" JPEG marker-segment walking shared by jpegreader.py and rafreader.py. """
+import struct
+
+_U16_BE = struct.Struct('>H')
+
+# Returned by find_exif_segment when data ends before the walk could tell
+# whether there is an EXIF segment, i.e. more of the file is needed.
+TRUNCATED = 'truncated'
+
+def find_exif_segment(data):
+    """ Finds the APP1 EXIF segment of a JPEG.
+
+    Walks the marker segments from SOI using their lengths and stops at the
+    start of scan, so the entropy-coded image data is never searched.
+    Returns (start, end), the index of the FF E1 marker and one past the end
+    of the segment, None if the walk shows there is no such segment, or
+    TRUNCATED if data ends first.
+    """
+    if len(data) < 2:
+        return TRUNCATED
+    if data[:2] != b'\xFF\xD8':
+        return None
+    unpack_length = _U16_BE.unpack_from
+    dlen = len(data)
+    index = 2
+    while index + 4 <= dlen:
+        if data[index] != 0xFF:
+            return None
+        marker = data[index+1]
+        if marker == 0xFF:  # Fill byte before a marker
+            index += 1
+            continue
+        if marker == 0xDA or marker == 0xD9:  # SOS or EOI, no metadata past here
+            return None
+        length, = unpack_length(data, index + 2)
+        end = index + 2 + length
+        if end > dlen:
+            return TRUNCATED
+        if marker == 0xE1 and data[index+4:index+10] == b'Exif\0\0':
+            return index, end
+        index = end
+    return TRUNCATED
@@ -1,55 +1,136 @@
+import functools
+import logging
+import mmap
 import struct
 
-# Common EXIF tags
-EXIF_TAGS = {
-    0x0100: 'ImageWidth',
-    0x0101: 'ImageHeight',
-    0x010f: 'Make',
-    0x0110: 'Model',
-    0x0112: 'Orientation',
-    0x011a: 'XResolution',
-    0x011b: 'YResolution',
-    0x013b: 'Artist',
-    0x013e: 'WhitePoint',
-    0x013f: 'PrimaryChromaticities',
-    0x0128: 'ResolutionUnit',
-    0x0131: 'Software',
-    0x0132: 'DateTime',
-    0x0211: 'YCbCrCoefficients',
-    0x0213: 'YCbCrPositioning',
-    0x8769: 'ExifOffset',
-    0x8298: 'Copyright',
-    0x8769: 'Exif Offset',
-    0x829a: 'ExposureTime',
-    0x829d: 'FNumber',
-    0x8827: 'ISOSpeedRatings',
-    0x9003: 'DateTimeOriginal',
-    0x9004: 'DateTimeDigitized',
-    0x9201: 'ShutterSpeedValue',
-    0x9202: 'ApertureValue',
-    0x9204: 'ExposureBiasValue',
-    0x9206: 'SubjectDistance',
-    0x9207: 'MeteringMode',
-    0x9209: 'Flash',
-    0x927c: 'MakerNote',
-    0x9286: 'UserComment',
-    0xa001: 'ColorSpace',
-    0xa002: 'ExifImageWidth',
-    0xa003: 'ExifImageHeight',
-    0xa005: 'InteroperabilityOffset',
-    0xa430: 'CameraOwnerName',
-    0xa431: 'SerialNumber',
-    0xa432: 'LensInfo',
-    0xa433: 'LensMake',
-    0xa434: 'LensModel',
-    0xa435: 'LensSerialNumber',
-    0xc4a5: 'PrintIM',
-}
-
-def parse_exif(data):
-    start = data.find(b'\xff\xe1')
-    if start == -1:
+from _exif_tags import EXIF_TAGS
+from _jpeg import TRUNCATED, find_exif_segment
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Precompiled formats for the fixed-size header fields and IFD entries.
+_U16_LE = struct.Struct('<H')
+_U16_BE = struct.Struct('>H')
+_U32_LE = struct.Struct('<I')
+_U32_BE = struct.Struct('>I')
+_HDR_LE = struct.Struct('<HHII')
+_HDR_BE = struct.Struct('>HHII')
+
+# Variable-count value formats. An IFD only uses a handful of distinct
+# (endian, typecode, count) shapes, so each is compiled once; the bound
+# keeps corrupt counts from growing the cache without limit.
+@functools.lru_cache(maxsize=256)
+def _value_struct(endian_symbol, typecode, count):
+    return struct.Struct(f'{endian_symbol}{count}{typecode}')
+
+# How much of a JPEG to read up front; enough for SOI, APP0 and a full APP1.
+_HEAD_SIZE = 131072
+
+# Arrays with at least this many elements are decoded as zero-copy NumPy
+# views when NumPy is available; shorter ones are cheaper through struct.
+_NUMPY_MIN_COUNT = 16
+
+# Bytes per element of the Short, Long and Rational types, used to bounds
+# check a value before picking a decoder so both raise the same error.
+_VALUE_SIZES = {3: 2, 4: 4, 5: 8}
+
+if np is not None:
+    _NP_SHORT = {'<': np.dtype('<u2'), '>': np.dtype('>u2')}
+    _NP_LONG = {'<': np.dtype('<u4'), '>': np.dtype('>u4')}
+    _NP_RATIONAL = {e: np.dtype([('n', e + 'u4'), ('d', e + 'u4')]) for e in '<>'}
+
+def _walk_ifd(data, offset, little):
+    """ Returns the (tag, type, count, value_offset) entries of the IFD at offset. """
+    if offset < 0 or offset + 2 > len(data):
+        raise ValueError("Invalid EXIF data.")
+    number_of_tags, = (_U16_LE if little else _U16_BE).unpack_from(data, offset)
+    end = offset + 2 + 12 * number_of_tags
+    if end > len(data):
+        raise ValueError("Invalid EXIF data.")
+    return list((_HDR_LE if little else _HDR_BE).iter_unpack(data[offset + 2:end]))
+
+# Use the compiled walker from _exif_fast.pyx when it has been built with
+# `cythonize -i _exif_fast.pyx`; test_exif_fast.py checks the two agree
+try:
+    from _exif_fast import walk_ifd
+except ImportError:
+    walk_ifd = _walk_ifd
+
+def _make_ifd_parser(endian_symbol):
+    """ Builds an IFD parser with everything specific to one byte order bound in. """
+    little = endian_symbol == '<'
+    if np is not None:
+        np_short = _NP_SHORT[endian_symbol]
+        np_long = _NP_LONG[endian_symbol]
+        np_rational = _NP_RATIONAL[endian_symbol]
+
+    def parse_ifd(mv, offset, file_offset, wanted):
+        debug = logger.isEnabledFor(logging.DEBUG)
+        use_numpy = np is not None
+        tag_get = EXIF_TAGS.get
+        size_get = _VALUE_SIZES.get
+        data_len = len(mv)
+        for tag, type, count, value_offset in walk_ifd(mv, offset, little):
+            if wanted is not None and tag not in wanted:
+                continue
+            if debug:
+                tag_name = tag_get(tag, f'Unknown tag 0x{tag:04X}')
+                logger.debug('%s %s %s %s %s', tag_name, type, value_offset, file_offset + value_offset, count)
+            # count += 1
+
+            size = size_get(type)
+            if size is not None and file_offset + value_offset + size * count > data_len:
+                raise ValueError("Invalid EXIF data.")
+
+            value = None
+            if type == 1:  # Byte
+                value = mv[file_offset + value_offset: file_offset + value_offset + count].tobytes()
+            elif type == 2:  # ASCII
+                value = str(mv[file_offset + value_offset:file_offset + value_offset + count], 'ascii')
+            elif type == 3:  # Short
+                if use_numpy and count >= _NUMPY_MIN_COUNT:
+                    value = np.frombuffer(mv, dtype=np_short, count=count, offset=file_offset + value_offset)
+                else:
+                    value = _value_struct(endian_symbol, 'H', count).unpack_from(mv, file_offset + value_offset)
+            elif type == 4:  # Long
+                if use_numpy and count >= _NUMPY_MIN_COUNT:
+                    value = np.frombuffer(mv, dtype=np_long, count=count, offset=file_offset + value_offset)
+                else:
+                    value = _value_struct(endian_symbol, 'I', count).unpack_from(mv, file_offset + value_offset)
+            elif type == 5:  # Rational
+                if use_numpy and count >= _NUMPY_MIN_COUNT:
+                    value = np.frombuffer(mv, dtype=np_rational, count=count, offset=file_offset + value_offset)
+                else:
+                    rational_values = _value_struct(endian_symbol, 'I', count * 2).unpack_from(mv, file_offset + value_offset)
+                    value = list(zip(rational_values[0::2], rational_values[1::2]))
+            
+            if debug:
+                logger.debug('Tag %s (0x%04X): %s', tag_name, tag, value)
+
+    return parse_ifd
+
+_PARSE_IFD_LE = _make_ifd_parser('<')
+_PARSE_IFD_BE = _make_ifd_parser('>')
+
+def parse_exif(data, wanted=None):
+    """ Parses the EXIF block of a JPEG.
+
+    data must hold the JPEG from its SOI marker on; the EXIF segment is found
+    by walking the marker segments. If wanted is a set of tag ids, only those
+    tags are decoded.
+    """
+    _parse_exif_segment(data, find_exif_segment(data), wanted)
+
+def _parse_exif_segment(data, segment, wanted):
+    """ Parses the EXIF block of the APP1 segment found by find_exif_segment. """
+    if segment is None or segment is TRUNCATED:
         raise ValueError("No APP1 header found.")
+    start = segment[0]
     
     # length = int.from_bytes(data[start+2:start+4], byteorder='big')
     
@@ -57,51 +138,44 @@ def parse_exif(data):
     # end = start + length
     # exif_data = data[start:end]
     
-    if data[start: start + 6] != b'Exif\0\0':
+    # Index through a view so slicing below does not copy the buffer
+    mv = memoryview(data)
+
+    if mv[start: start + 6] != b'Exif\0\0':
         raise ValueError("Invalid EXIF data.")
     
-    endian = data[start + 6:start + 8]
-    endian_symbol = '<' if endian == b'II' else '>'
+    # Pick the byte order once; everything after runs specialized to it
+    if mv[start + 6:start + 8] == b'II':
+        u32, parse_ifd = _U32_LE.unpack_from, _PARSE_IFD_LE
+    else:
+        u32, parse_ifd = _U32_BE.unpack_from, _PARSE_IFD_BE
 
-    offset_to_ifd = int.from_bytes(data[start + 10:start + 14], byteorder='little' if endian_symbol == '<' else 'big')
+    offset_to_ifd = u32(mv, start + 10)[0]
     offset = start + 6 + offset_to_ifd
-    
-    number_of_tags, = struct.unpack(f'{endian_symbol}H', data[offset:offset+2])
-    offset += 2
 
     file_offset = 12
 
-    for _ in range(number_of_tags):
-        tag, type, count, value_offset = struct.unpack(f'{endian_symbol}HHII', data[offset:offset+12])
-        tag_name = EXIF_TAGS.get(tag, f'Unknown tag 0x{tag:04X}')
-
-        print(tag_name, type, value_offset, file_offset + value_offset, count)
-        # count += 1
-
-        value = None
-        if type == 1:  # Byte
-            value = data[file_offset + value_offset: file_offset + value_offset + count]
-        elif type == 2:  # ASCII
-            value = data[file_offset + value_offset:file_offset + value_offset + count].decode('ascii')
-        elif type == 3:  # Short
-            value_format = f'{endian_symbol}{count}H'
-            value = struct.unpack(value_format, data[file_offset + value_offset:file_offset + value_offset + 2 * count])
-        elif type == 4:  # Long
-            value_format = f'{endian_symbol}{count}I'
-            value = struct.unpack(value_format, data[file_offset + value_offset:file_offset + value_offset + 4 * count])
-        elif type == 5:  # Rational
-            value_format = f'{endian_symbol}{count * 2}I'
-            rational_values = struct.unpack(value_format, data[file_offset + value_offset:file_offset + value_offset + 8 * count])
-            value = [(rational_values[i], rational_values[i+1]) for i in range(0, len(rational_values), 2)]
-        
-        print(f"Tag {tag_name} (0x{tag:04X}): {value}")
-        offset += 12
-
-def read_exif_from_jpeg(filepath):
+    parse_ifd(mv, offset, file_offset, wanted)
+
+def read_exif_from_jpeg(filepath, wanted=None):
+    # EXIF sits right after SOI, so a single bounded read usually covers it
     with open(filepath, 'rb') as file:
-        data = file.read()
-    
-    parse_exif(data)
+        data = file.read(_HEAD_SIZE)
+        segment = find_exif_segment(data)
+        if len(data) == _HEAD_SIZE and segment is TRUNCATED:
+            # Map the rest instead of reading it so only the pages parse_exif
+            # touches are loaded. No views escape a successful parse, but if
+            # it raises, the traceback keeps its frames' views of the map
+            # alive and closing it would raise BufferError over the real
+            # error, so it is unmapped when collected rather than closed.
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            segment = find_exif_segment(data)
+    _parse_exif_segment(data, segment, wanted)
+
+def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+    # Example usage
+    read_exif_from_jpeg('output.jpg')
 
-# Example usage
-read_exif_from_jpeg('output.jpg')
+if __name__ == "__main__":
+    main()
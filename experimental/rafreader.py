@@ -1,153 +1,232 @@
+import logging
 import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from _exif_tags import EXIF_TAGS
+from _jpeg import TRUNCATED, find_exif_segment
+
+logger = logging.getLogger(__name__)
+
+# Precompiled TIFF header and IFD entry formats, one per byte order.
+_U16 = {'<': struct.Struct('<H'), '>': struct.Struct('>H')}
+_U32 = {'<': struct.Struct('<L'), '>': struct.Struct('>L')}
+_ENTRY = {'<': struct.Struct('<HHLL'), '>': struct.Struct('>HHLL')}
+
+# JPEG offset/length, CFA header offset/length and CFA offset/length,
+# stored after the 60-byte header and 24 reserved bytes.
+_RAF_PTRS = struct.Struct('>IIIIII')
+_RAF_PTRS_OFFSET = 84
+
+# How much of the embedded JPEG to read up front when looking for EXIF.
+_JPEG_HEAD_SIZE = 65536
+
+# Scratch buffer for the RAF header and the head of the embedded JPEG, reused
+# across calls so parsing many files does not allocate per file. Each thread
+# gets its own, so concurrent readers never see each other's bytes.
+_RAF_HEADER_SIZE = _RAF_PTRS_OFFSET + _RAF_PTRS.size
+_scratch = threading.local()
+
+def _scratch_buffer():
+    buf = getattr(_scratch, 'buf', None)
+    if buf is None:
+        buf = _scratch.buf = memoryview(bytearray(_RAF_HEADER_SIZE + _JPEG_HEAD_SIZE))
+    return buf
 
 def read_raf_file(filepath):
-    RAF_TIFF1_PTR_OFFSET = 84
     RAF_TIFF2_PTR_OFFSET = 100
     RAF_TAGS_PTR_OFFSET = 92
-    with open(filepath, 'rb') as file:
+    scratch = _scratch_buffer()
+    # Unbuffered, so readinto goes straight into the scratch buffer
+    with open(filepath, 'rb', buffering=0) as file:
+        # The header fields, reserved bytes and offset table are contiguous,
+        # so fetch them in one read. Some cameras write non-ASCII bytes in
+        # the strings, so decode leniently. Trim to what was actually read
+        # so a short file cannot pick up the previous file's bytes.
+        header = scratch[:_RAF_HEADER_SIZE]
+        header = header[:file.readinto(header)]
+
         # Read the magic string
-        magic = file.read(16).decode('ascii').strip()
+        magic = header[0:16].tobytes().strip().decode('ascii', 'replace')
         print("Magic String:", magic)
         
         # Read format version
-        format_version = file.read(4).decode('ascii')
+        format_version = header[16:20].tobytes().decode('ascii', 'replace')
         print("Format Version:", format_version)
         
         # Read camera number ID
-        camera_id = file.read(8).decode('ascii')
+        camera_id = header[20:28].tobytes().decode('ascii', 'replace')
         print("Camera ID:", camera_id)
         
         # Read camera string
-        camera_string = file.read(32).decode('ascii').strip('\x00')
+        camera_string = header[28:60].tobytes().rstrip(b'\x00 ').decode('ascii', 'replace')
         print("Camera String:", camera_string)
         
-        # Skipping 24 bytes to reach the JPEG image offset
-        file.seek(24, 1)  # relative seek from current position
-        
-        # Read JPEG image offset and length
-        jpeg_offset = struct.unpack('>I', file.read(4))[0]
-        jpeg_length = struct.unpack('>I', file.read(4))[0]
+        # Read JPEG, CFA header and CFA offsets and lengths, skipping the
+        # 24 reserved bytes after the camera string
+        (jpeg_offset, jpeg_length,
+         cfa_header_offset, cfa_header_length,
+         cfa_offset, cfa_length) = _RAF_PTRS.unpack_from(header, _RAF_PTRS_OFFSET)
         print("JPEG Image Offset:", jpeg_offset)
         print("JPEG Image Length:", jpeg_length)
-        
-        # Read CFA Header Offset and Length
-        cfa_header_offset = struct.unpack('>I', file.read(4))[0]
-        cfa_header_length = struct.unpack('>I', file.read(4))[0]
         print("CFA Header Offset:", cfa_header_offset)
         print("CFA Header Length:", cfa_header_length)
-        
-        # Read CFA Offset and Length
-        cfa_offset = struct.unpack('>I', file.read(4))[0]
-        cfa_length = struct.unpack('>I', file.read(4))[0]
         print("CFA Offset:", cfa_offset)
         print("CFA Length:", cfa_length)
 
-
-
-
-        # Optionally, go to the JPEG offset and read some JPEG data
-        file.seek(jpeg_offset)
-        jpeg_data = file.read(jpeg_length)  # just reading the first 10 bytes of the JPEG image
-        exif_data = find_app1_exif(jpeg_data)
+        exif_data = _read_jpeg_exif(file, jpeg_offset, jpeg_length, scratch[_RAF_HEADER_SIZE:])
         if not exif_data:
             print("No EXIF data found.")
             return
 
         parse_exif(exif_data)
 
-        # output = open('output.jpg', 'wb')
-        # output.write(jpeg_data)
-
-EXIF_TAGS = {
-    0x010F: 'Make',
-    0x0110: 'Model',
-    0x0112: 'Orientation',
-    0x011A: 'XResolution',
-    0x011B: 'YResolution',
-    0x0128: 'ResolutionUnit',
-    0x0131: 'Software',
-    0x0132: 'DateTime',
-    0x0213: 'YCbCrPositioning',
-    0x8769: 'ExifOffset',
-    0x829A: 'ExposureTime',
-    0x829D: 'FNumber',
-    0x8827: 'ISOSpeedRatings',
-    0x9003: 'DateTimeOriginal',
-    0x9004: 'DateTimeDigitized',
-    0x9201: 'ShutterSpeedValue',
-    0x9202: 'ApertureValue',
-    0x9204: 'ExposureBiasValue',
-    0x9207: 'MeteringMode',
-    0x9209: 'Flash',
-    0x9214: 'SubjectArea',
-    0x927C: 'MakerNote',
-    0x9286: 'UserComment',
-    0xA001: 'ColorSpace',
-    0xA002: 'ExifImageWidth',
-    0xA003: 'ExifImageHeight',
-    0xA005: 'InteroperabilityOffset',
-    0xA20E: 'FocalPlaneXResolution',
-    0xA20F: 'FocalPlaneYResolution',
-    0xA210: 'FocalPlaneResolutionUnit',
-    0xA217: 'SensingMethod',
-    0xA300: 'FileSource',
-    0xA301: 'SceneType',
-}
+def _read_jpeg_exif(file, jpeg_offset, jpeg_length, head_buf):
+    """ Returns the EXIF block of the JPEG embedded at jpeg_offset, or None.
+
+    The EXIF segment sits right after SOI, so only the head of the JPEG is
+    read into head_buf, falling back to the rest of it only if the head ends
+    before the segment walk can decide. The result may be a view into
+    head_buf and is only valid until head_buf is reused.
+    """
+    file.seek(jpeg_offset)
+    jpeg_head = head_buf[:min(jpeg_length, len(head_buf))]
+    jpeg_data = jpeg_head[:file.readinto(jpeg_head)]
+    segment = find_exif_segment(jpeg_data)
+    if segment is TRUNCATED and jpeg_length > len(jpeg_data):
+        jpeg_data = jpeg_data.tobytes() + file.read(jpeg_length - len(jpeg_data))
+        segment = find_exif_segment(jpeg_data)
+    return _exif_view(jpeg_data, segment)
+
+def _exif_view(data, segment):
+    """ Returns a view of the EXIF block in segment, or None if there is none. """
+    if segment is None or segment is TRUNCATED:
+        return None
+    start, end = segment
+    return memoryview(data)[start+10:end]
 
 def find_app1_exif(data):
-    """ Finds the APP1 EXIF marker and extracts the EXIF block. """
-    index = 0
-    while index + 4 < len(data):
-        if data[index:index+2] == b'\xFF\xE1':
-            length = struct.unpack('>H', data[index+2:index+4])[0]
-            if data[index+4:index+10] == b'Exif\0\0':
-                return data[index+10:index+2+length]
-        index += 1
-    return None
+    """ Finds the APP1 EXIF segment and returns a view of the EXIF block.
+
+    Returns None if there is no such block or it runs past the end of data.
+    """
+    return _exif_view(data, find_exif_segment(data))
+
+def _make_parser(endian):
+    """ Builds a TIFF/IFD walker with the unpackers for one byte order bound in. """
+    unpack_num = _U16[endian].unpack_from
+    unpack_entry = _ENTRY[endian].unpack_from
+    unpack_offset = _U32[endian].unpack_from
+    tag_get = EXIF_TAGS.get
+
+    def parse(data):
+        debug = logger.isEnabledFor(logging.DEBUG)
+        dlen = len(data)
+        last_entry = dlen - 12
+
+        # Check the TIFF header
+        magic, = unpack_num(data, 2)
+        if magic != 42:
+            print("Invalid TIFF magic number.")
+            return
+
+        # Get the offset to the first IFD
+        first_ifd_offset, = unpack_offset(data, 4)
+        offset = first_ifd_offset + 6  # Plus six because TIFF header starts after 'Exif\0\0'
+
+        while offset and offset < dlen - 2:
+            num_tags, = unpack_num(data, offset)
+            offset += 2
+            if debug:
+                logger.debug('Reading %s tags at offset %s', num_tags, offset)
+
+            for _ in range(num_tags):
+                if offset > last_entry:
+                    print("Offset out of bounds for data size")
+                    return  # Safety check for buffer overflow
+                tag, typ, count, value_offset = unpack_entry(data, offset)
+                if debug:
+                    tag_name = tag_get(tag, f"Unknown tag 0x{tag:04X}")
+                    logger.debug('Tag %s (%s) at offset %s', tag_name, tag, offset)
+
+                # Move to the next tag
+                offset += 12
+
+            # Move to the next IFD
+            if offset + 4 > dlen:
+                break
+            next_ifd_offset, = unpack_offset(data, offset)
+            if next_ifd_offset == 0:
+                break
+            offset = next_ifd_offset
+
+    return parse
+
+_PARSE_LE = _make_parser('<')
+_PARSE_BE = _make_parser('>')
 
 def parse_exif(data):
     """ Parses the EXIF data from a JPEG's EXIF block. """
-    if data[:2] in (b'II', b'MM'):
-        endian = '<' if data[:2] == b'II' else '>'
+    byte_order = data[:2]
+    if byte_order == b'II':
+        _PARSE_LE(data)
+    elif byte_order == b'MM':
+        _PARSE_BE(data)
     else:
         print("Invalid TIFF data.")
-        return
-
-    # Check the TIFF header
-    magic, = struct.unpack(endian + 'H', data[2:4])
-    if magic != 42:
-        print("Invalid TIFF magic number.")
-        return
-
-    # Get the offset to the first IFD
-    first_ifd_offset, = struct.unpack(endian + 'L', data[4:8])
-    offset = first_ifd_offset + 6  # Plus six because TIFF header starts after 'Exif\0\0'
-
-    while offset and offset < len(data) - 2:
-        num_tags, = struct.unpack(endian + 'H', data[offset:offset+2])
-        offset += 2
-        print(f"Reading {num_tags} tags at offset {offset}")
-
-        for _ in range(num_tags):
-            if offset > len(data) - 12:
-                print("Offset out of bounds for data size")
-                return  # Safety check for buffer overflow
-            tag, typ, count, value_offset = struct.unpack(endian + 'HHLL', data[offset:offset+12])
-            tag_name = EXIF_TAGS.get(tag, f"Unknown tag 0x{tag:04X}")
-            print(f"Tag {tag_name} ({tag}) at offset {offset}")
-
-            # Move to the next tag
-            offset += 12
-
-        # Move to the next IFD
-        if offset + 4 > len(data):
-            break
-        next_ifd_offset, = struct.unpack(endian + 'L', data[offset:offset+4])
-        if next_ifd_offset == 0:
-            break
-        offset = next_ifd_offset
+
+def _read_raf_exif(filepath):
+    """ Returns a copy of the EXIF block embedded in a RAF file.
+
+    Returns (exif_data, error): exif_data is None if the file has no EXIF
+    block, and error is the exception if the file could not be read.
+    """
+    scratch = _scratch_buffer()
+    try:
+        with open(filepath, 'rb', buffering=0) as file:
+            header = scratch[:_RAF_HEADER_SIZE]
+            header = header[:file.readinto(header)]
+            jpeg_offset, jpeg_length = _RAF_PTRS.unpack_from(header, _RAF_PTRS_OFFSET)[:2]
+            exif_data = _read_jpeg_exif(file, jpeg_offset, jpeg_length, scratch[_RAF_HEADER_SIZE:])
+    except (OSError, struct.error) as e:
+        return None, e
+    # Copy the small EXIF block out so the result does not pin the
+    # scratch buffer or the whole embedded JPEG
+    return (None if exif_data is None else bytes(exif_data)), None
+
+def read_exif_batch(filepaths, max_workers=32):
+    """ Reads and parses the EXIF block of many RAF files.
+
+    Each file is read independently through its own handle, so the reads
+    are issued from a thread pool to keep several in flight at once. A
+    single file is read inline to skip the pool setup.
+
+    Returns (exif_blocks, errors): exif_blocks holds the EXIF block of each
+    file in the order of filepaths, or None if it has none or could not be
+    read; errors maps each file that could not be read to its exception.
+    """
+    filepaths = list(filepaths)
+    if len(filepaths) == 1:
+        results = [_read_raf_exif(filepaths[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_read_raf_exif, filepaths))
+
+    exif_blocks = []
+    errors = {}
+    for filepath, (exif_data, error) in zip(filepaths, results):
+        exif_blocks.append(exif_data)
+        if error is not None:
+            errors[filepath] = error
+            print(f"Could not read {filepath}: {error}")
+        elif exif_data is None:
+            print(f"No EXIF data found in {filepath}.")
+        else:
+            parse_exif(exif_data)
+    return exif_blocks, errors
 
 def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(message)s')
     filepath = "/Users/satyajits/Pictures/TestFolder/_DSF5533.RAF"
     read_raf_file(filepath)
 
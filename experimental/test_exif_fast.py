@@ -0,0 +1,69 @@
+""" Checks that the compiled walk_ifd in _exif_fast.pyx matches _walk_ifd.
+
+Run from this directory with `python -m unittest test_exif_fast`; skipped
+when Cython is not installed.
+"""
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import jpegreader
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ENTRIES = [(0x010F, 2, 9, 0x12345678), (0xA002, 4, 1, 0xFFFFFFFF), (0xFFFF, 0xFFFF, 0, 0)]
+
+def _ifd(little, entries=ENTRIES):
+    """ Returns two pad bytes followed by an IFD holding entries. """
+    u16, hdr = (jpegreader._U16_LE, jpegreader._HDR_LE) if little else (jpegreader._U16_BE, jpegreader._HDR_BE)
+    return b'\0\0' + u16.pack(len(entries)) + b''.join(hdr.pack(*e) for e in entries)
+
+@unittest.skipIf(importlib.util.find_spec('Cython') is None, "Cython is not installed")
+class WalkIfdParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.build_dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(HERE, '_exif_fast.pyx'), cls.build_dir)
+        subprocess.run([sys.executable, '-m', 'Cython.Build.Cythonize', '-i', '-q', '_exif_fast.pyx'],
+                       cwd=cls.build_dir, check=True, capture_output=True)
+        sys.path.insert(0, cls.build_dir)
+        try:
+            import _exif_fast
+        finally:
+            sys.path.remove(cls.build_dir)
+        cls.walk_ifd = staticmethod(_exif_fast.walk_ifd)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.build_dir)
+
+    def test_little_endian(self):
+        data = memoryview(_ifd(True))
+        self.assertEqual(self.walk_ifd(data, 2, True), jpegreader._walk_ifd(data, 2, True))
+
+    def test_big_endian(self):
+        data = memoryview(_ifd(False))
+        self.assertEqual(self.walk_ifd(data, 2, False), jpegreader._walk_ifd(data, 2, False))
+
+    def test_empty_ifd(self):
+        data = memoryview(_ifd(True, []))
+        self.assertEqual(self.walk_ifd(data, 2, True), jpegreader._walk_ifd(data, 2, True))
+
+    def test_truncated(self):
+        for little in (True, False):
+            data = memoryview(_ifd(little)[:-1])
+            for walk in (self.walk_ifd, jpegreader._walk_ifd):
+                with self.assertRaises(ValueError):
+                    walk(data, 2, little)
+            # Offset past the end, or too close to it for the tag count
+            for offset in (len(data), len(data) - 1):
+                for walk in (self.walk_ifd, jpegreader._walk_ifd):
+                    with self.assertRaises(ValueError):
+                        walk(data, offset, little)
+
+if __name__ == '__main__':
+    unittest.main()